@@ -1,3 +1,4 @@
+import hmac
 import logging
 
 import requests
@@ -22,6 +23,7 @@ class CloudClient(object):
         """
         self.API_KEY = api_key
         self.SECRET_KEY = secret_key
+        self._sign_mac = hmac.new(bytes(secret_key or '', encoding='utf8'), digestmod='sha256')
         self.MEMO = memo
         self.URL = url
         self.TIMEOUT = timeout
@@ -55,7 +57,7 @@ class CloudClient(object):
             header = cloud_utils.get_header(self.API_KEY, sign=None, timestamp=None, headers=self.HEADERS)
         else:
             timestamp = cloud_utils.get_timestamp()
-            sign = cloud_utils.sign(cloud_utils.pre_substring(timestamp, self.MEMO, str(body)), self.SECRET_KEY)
+            sign = cloud_utils.sign_with(self._sign_mac, cloud_utils.pre_substring(timestamp, self.MEMO, str(body)))
             header = cloud_utils.get_header(self.API_KEY, sign, timestamp, headers=self.HEADERS)
 
         self._logger.debug(f"[{method}] url={url}")
@@ -13,6 +13,13 @@ def sign(message, secret_key):
     return mac.hexdigest()
 
 
+def sign_with(mac, message):
+    """Sign with a pre-keyed HMAC object; copying it skips re-keying on every request."""
+    mac = mac.copy()
+    mac.update(bytes(message, encoding='utf-8'))
+    return mac.hexdigest()
+
+
 # timestamp + "#" + memo + "#" + queryString
 def pre_substring(timestamp, memo, body):
     return f'{str(timestamp)}#{memo}#{body}'
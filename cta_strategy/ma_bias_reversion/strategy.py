@@ -1,18 +1,30 @@
 import time
+import atexit
 import logging
 import config
 import os
 import sys
 import csv
+import socket
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from decimal import Decimal, getcontext
 from datetime import datetime
 
+try:
+    from numba import njit
+except ImportError:
+    # 未安裝 numba 時，指標核心直接以 Python 執行
+    def njit(*args, **kwargs):
+        return lambda func: func
+
 # --- 路徑設定 ---
 # 確保無論從哪裡執行，都能正確 import config 並找到日誌檔案
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 if SCRIPT_DIR not in sys.path:
     sys.path.insert(0, SCRIPT_DIR)
 
+from requests.adapters import HTTPAdapter
 from bitmart.api_contract import APIContract
 from bitmart.lib.cloud_exceptions import APIException
 
@@ -28,58 +40,138 @@ logging.basicConfig(level=logging.INFO,
                         logging.FileHandler(log_file, mode='w'),
                         logging.StreamHandler() # 同時輸出到控制台
                     ])
+logger = logging.getLogger(__name__)
+
+# K 線快取的欄位: 開盤時間戳 (秒) 與收盤價
+KLINE_DTYPE = np.dtype([('ts', 'i8'), ('close', 'f8')])
+
+# 開倉後輪詢倉位的退避設定 (秒)
+POSITION_POLL_INITIAL_DELAY = 0.05
+POSITION_POLL_MAX_DELAY = 0.8
+POSITION_POLL_TIMEOUT = 5
+
+# K 線收盤後額外等待的秒數，避免在交易所產生新 K 線前就請求
+KLINE_CLOSE_JITTER = 0.25
 
-# 設定 Decimal 運算精度
+# 取消計畫委託時，沒有委託可取消的錯誤訊息 (可忽略)
+PLAN_ORDER_NOT_EXISTS = 'plan order not exists'
+
+# 設定 Decimal 運算精度 (僅用於下單價格計算，指標使用 float64)
 getcontext().prec = 10
 
-def update_status(message):
-    """將策略的即時狀態寫入檔案"""
-    with open(STATUS_FILE, 'w') as f:
-        f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {message}")
+@njit(cache=True, fastmath=True)
+def _ma_bias(closes, n):
+    """計算最後 n 根收盤價的 MA 與 BIAS"""
+    s = 0.0
+    for i in range(closes.size - n, closes.size):
+        s += closes[i]
+    ma = s / n
+    bias = (closes[-1] - ma) / ma if ma != 0.0 else 0.0
+    return ma, bias
+
+# 交易紀錄檔在首次寫入時開啟並保持開啟，程式結束時關閉
+_trade_fp = None
+_trade_writer = None
+
+def _get_trade_writer():
+    global _trade_fp, _trade_writer
+    if _trade_writer is None:
+        _trade_fp = open(TRADE_HISTORY_FILE, 'a', newline='', buffering=64 * 1024)
+        atexit.register(_trade_fp.close)
+        _trade_writer = csv.writer(_trade_fp)
+        if _trade_fp.tell() == 0:
+            # 寫入標頭
+            _trade_writer.writerow(['timestamp', 'symbol', 'side', 'amount', 'pnl', 'fee', 'notes'])
+    return _trade_writer
 
 def log_trade(trade_data):
     """將完成的交易記錄到 CSV 檔案"""
-    file_exists = os.path.isfile(TRADE_HISTORY_FILE)
-    with open(TRADE_HISTORY_FILE, 'a', newline='') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            # 寫入標頭
-            writer.writerow(['timestamp', 'symbol', 'side', 'amount', 'pnl', 'fee', 'notes'])
-        writer.writerow([datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                         trade_data.get('symbol'),
-                         trade_data.get('side'),
-                         trade_data.get('amount'),
-                         trade_data.get('pnl'),
-                         trade_data.get('fee'),
-                         trade_data.get('notes')])
+    _get_trade_writer().writerow([datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                  trade_data.get('symbol'),
+                                  trade_data.get('side'),
+                                  trade_data.get('amount'),
+                                  trade_data.get('pnl'),
+                                  trade_data.get('fee'),
+                                  trade_data.get('notes')])
+    _trade_fp.flush()
+
+class KeepAliveAdapter(HTTPAdapter):
+    """復用 TCP/TLS 連線的 HTTP adapter，並關閉 Nagle 演算法"""
+    SOCKET_OPTIONS = [
+        (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
 
 class TradingStrategy:
+    __slots__ = ('api', 'trade_enabled', 'symbol', 'kline_step', 'ma_period',
+                 'last_kline_open_time', 'active_position', '_klines_cache',
+                 '_order_templates', '_io_pool', '_status_fd',
+                 '_last_status_sec', '_last_status_prefix')
+
     def __init__(self):
         """初始化策略"""
-        logging.info("策略初始化...")
+        logger.info("策略初始化...")
+        # 狀態檔保持開啟，每次更新直接覆寫內容
+        self._status_fd = os.open(STATUS_FILE, os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        self._last_status_sec = -1 # 同一秒內重用已格式化的時間前綴
+        self._last_status_prefix = ''
+        self.symbol = config.SYMBOL
+        self.kline_step = config.TIMEFRAME_MINUTES
+        self.ma_period = config.MA_PERIOD
+        self.last_kline_open_time = 0
+        self.active_position = None # 用於追蹤當前持倉狀態
+        self._klines_cache = np.empty(0, dtype=KLINE_DTYPE) # 最近 ma_period 根已收盤 K 線
+        # 下單參數模板: 固定欄位預先組好，送單時只補 side / expected_price
+        market_order = {'symbol': self.symbol, 'type': 'market', 'size': config.ORDER_SIZE}
+        self._order_templates = {
+            'open': {**market_order, 'mode': config.MARGIN_MODE, 'open_type': config.OPEN_TYPE},
+            'close': market_order,
+            'tp': {'symbol': self.symbol, 'order_type': 'tp', 'plan_type': 'normal'},
+            'sl': {'symbol': self.symbol, 'order_type': 'sl', 'plan_type': 'normal'},
+        }
+        self._io_pool = ThreadPoolExecutor(max_workers=2) # 併發送出互不相依的 API 請求
+
         if not hasattr(config, 'API_KEY') or config.API_KEY == "YOUR_API_KEY":
-            logging.warning("偵測到預設 API 金鑰，將以僅讀模式運行。")
+            logger.warning("偵測到預設 API 金鑰，將以僅讀模式運行。")
             self.api = APIContract(timeout=(10, 20))
             self.trade_enabled = False
+            self._setup_http_session()
         else:
             self.api = APIContract(config.API_KEY, config.SECRET_KEY, config.MEMO, timeout=(10, 20))
             self.trade_enabled = True
+            self._setup_http_session()
             self._prepare_trading_environment()
 
-        self.symbol = config.SYMBOL
-        self.kline_step = config.TIMEFRAME_MINUTES
-        self.ma_period = config.MA_PERIOD
-        self.last_kline_open_time = 0
-        self.active_position = None # 用於追蹤當前持倉狀態
+    def _setup_http_session(self):
+        """讓 SDK 的 requests.Session 保持長連線，避免每次請求重新握手"""
+        adapter = KeepAliveAdapter(pool_connections=4, pool_maxsize=8, pool_block=False)
+        self.api.session.mount('https://', adapter)
+        self.api.session.headers['Connection'] = 'keep-alive'
+
+    def update_status(self, message, now=None):
+        """將策略的即時狀態寫入檔案，now 為呼叫端已取得的時間戳"""
+        sec = int(time.time() if now is None else now)
+        if sec != self._last_status_sec:
+            self._last_status_sec = sec
+            self._last_status_prefix = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(sec))
+        data = f"{self._last_status_prefix}: {message}".encode('utf-8')
+        # 先覆寫再截斷，讀取端不會看到空檔案
+        os.lseek(self._status_fd, 0, os.SEEK_SET)
+        os.write(self._status_fd, data)
+        os.ftruncate(self._status_fd, len(data))
 
     def _prepare_trading_environment(self):
         if not self.trade_enabled: return
         try:
-            logging.info(f"設定交易對 {self.symbol} 的槓桿為 {config.LEVERAGE}x")
+            logger.info(f"設定交易對 {self.symbol} 的槓桿為 {config.LEVERAGE}x")
             self.api.submit_leverage(symbol=self.symbol, leverage=config.LEVERAGE)
             self.cancel_all_plan_orders("首次運行清理")
         except APIException as e:
-            logging.error(f"準備交易環境失敗: {e.response}")
+            logger.error(f"準備交易環境失敗: {e.response}")
             raise
 
     def check_trade_closure(self):
@@ -89,8 +181,8 @@ class TradingStrategy:
         
         current_position = self.get_position()
         if not current_position:
-            logging.info(f"倉位已關閉，記錄上一筆交易。原倉位方向: {self.active_position['side']}")
-            update_status("倉位已關閉，正在記錄交易...")
+            logger.info(f"倉位已關閉，記錄上一筆交易。原倉位方向: {self.active_position['side']}")
+            self.update_status("倉位已關閉，正在記錄交易...")
             try:
                 # 獲取最近的成交歷史
                 history = self.api.get_transaction_history(self.symbol, type=2) # type=2 代表已實現盈虧
@@ -105,10 +197,10 @@ class TradingStrategy:
                         'notes': f"TP/SL triggered. Closed at {last_trade.get('close_avg_price')}"
                     })
                 else:
-                    logging.warning("無法獲取成交歷史來記錄 PNL。")
+                    logger.warning("無法獲取成交歷史來記錄 PNL。")
                     log_trade({'notes': 'Position closed, but failed to fetch PNL history.'})
             except APIException as e:
-                logging.error(f"獲取成交歷史失敗: {e.response}")
+                logger.error(f"獲取成交歷史失敗: {e.response}")
             finally:
                 self.active_position = None # 清空倉位狀態
                 self.cancel_all_plan_orders("倉位關閉後清理")
@@ -116,25 +208,32 @@ class TradingStrategy:
     def get_kline_data(self):
         try:
             limit = self.ma_period + 5
+            step_sec = self.kline_step * 60
             end_time = int(time.time())
-            start_time = end_time - (limit * self.kline_step * 60)
+            # 已有快取時只請求 last_kline_open_time 之後的 K 線
+            start_time = max(self.last_kline_open_time, end_time - (limit * step_sec))
             response = self.api.get_kline(self.symbol, self.kline_step, start_time, end_time)
             if response[0]['code'] != 1000: return None
-            klines = response[0]['data']
-            klines.sort(key=lambda x: int(x['timestamp']))
-            if int(klines[-1]['timestamp']) + self.kline_step * 60 > end_time: klines = klines[:-1]
-            if len(klines) < self.ma_period: return None
+            data = response[0]['data']
+            new_klines = np.fromiter(((int(k['timestamp']), float(k['close_price'])) for k in data),
+                                     dtype=KLINE_DTYPE, count=len(data))
+            new_klines.sort(order='ts')
+            new_klines = new_klines[new_klines['ts'] > self.last_kline_open_time]
+            if new_klines.size and new_klines['ts'][-1] + step_sec > end_time: new_klines = new_klines[:-1]
+            # 快取中只有不晚於 last_kline_open_time 的 K 線，直接接上新 K 線即可保持有序
+            klines = np.concatenate((self._klines_cache, new_klines))[-self.ma_period:]
+            if klines.size < self.ma_period: return None
+            self._klines_cache = klines
+            if new_klines.size: self.last_kline_open_time = int(new_klines['ts'][-1])
             return klines
         except APIException as e:
-            logging.error(f"API 請求 K 線時出錯: {e.response}")
+            logger.error(f"API 請求 K 線時出錯: {e.response}")
             return None
 
     def calculate_indicators(self, klines):
-        close_prices = [Decimal(k['close_price']) for k in klines]
-        ma = sum(close_prices[-self.ma_period:]) / self.ma_period
-        current_price = close_prices[-1]
-        bias = (current_price - ma) / ma if ma != 0 else Decimal(0)
-        return {"current_price": current_price, "ma": ma, "bias": bias}
+        closes = klines['close']
+        ma, bias = _ma_bias(closes, self.ma_period)
+        return {"current_price": float(closes[-1]), "ma": float(ma), "bias": float(bias)}
 
     def get_position(self):
         if not self.trade_enabled: return None
@@ -143,95 +242,123 @@ class TradingStrategy:
             if response[0]['code'] != 1000 or not response[0]['data']: return None
             return response[0]['data'][0]
         except APIException as e:
-            logging.error(f"API 請求倉位時出錯: {e.response}")
+            logger.error(f"API 請求倉位時出錯: {e.response}")
             return None
 
+    def wait_for_position(self):
+        """以指數退避輪詢倉位，倉位出現即返回，逾時返回 None"""
+        delay = POSITION_POLL_INITIAL_DELAY
+        deadline = time.monotonic() + POSITION_POLL_TIMEOUT
+        while True:
+            position = self.get_position()
+            if position or time.monotonic() + delay > deadline: return position
+            time.sleep(delay)
+            delay = min(delay * 2, POSITION_POLL_MAX_DELAY)
+
     def cancel_all_plan_orders(self, reason=""):
         if not self.trade_enabled: return
         try:
-            logging.info(f"正在取消所有計畫委託... 原因: {reason}")
+            logger.info(f"正在取消所有計畫委託... 原因: {reason}")
             self.api.cancel_all_plan_order(symbol=self.symbol)
         except APIException as e:
-            if 'plan order not exists' not in str(e.response): logging.error(f"取消計畫委託失敗: {e.response}")
+            # APIException.response 已是回應原文 (str)，直接比對即可
+            if PLAN_ORDER_NOT_EXISTS not in e.response: logger.error(f"取消計畫委託失敗: {e.response}")
 
     def execute_trade_entry(self, side, indicators):
         if not self.trade_enabled: return
-        update_status(f"偵測到信號，準備開倉 (Side: {side})...")
+        self.update_status(f"偵測到信號，準備開倉 (Side: {side})...")
         try:
-            logging.info(f"準備以市價開倉: side={side}, size={config.ORDER_SIZE}")
-            response = self.api.new_order(symbol=self.symbol, side=side, type='market', size=config.ORDER_SIZE, mode=config.MARGIN_MODE, open_type=config.OPEN_TYPE)
-            if response[0]['code'] != 1000: logging.error(f"開倉失敗: {response[0]['message']}"); return
-            logging.info(f"開倉委託成功! Order ID: {response[0]['data']['order_id']}")
-        except APIException as e: logging.error(f"API 開倉時出錯: {e.response}"); return
+            logger.info(f"準備以市價開倉: side={side}, size={config.ORDER_SIZE}")
+            response = self.api.new_order(side=side, **self._order_templates['open'])
+            if response[0]['code'] != 1000: logger.error(f"開倉失敗: {response[0]['message']}"); return
+            logger.info(f"開倉委託成功! Order ID: {response[0]['data']['order_id']}")
+        except APIException as e: logger.error(f"API 開倉時出錯: {e.response}"); return
 
-        time.sleep(3)
-        position = self.get_position()
-        if not position: logging.error("開倉後未能查詢到倉位，無法設定 TP/SL。"); return
+        position = self.wait_for_position()
+        if not position: logger.error("開倉後未能查詢到倉位，無法設定 TP/SL。"); return
 
         self.active_position = position # 記錄活動倉位
         open_price = Decimal(position['open_avg_price'])
         position_side = position['side']
-        tp_price = indicators['ma']
+        tp_price = Decimal(repr(indicators['ma']))
         sl_price = open_price * (Decimal(1) - Decimal(config.STOP_LOSS_PERCENT)) if position_side == 'long' else open_price * (Decimal(1) + Decimal(config.STOP_LOSS_PERCENT))
         
         tp_price_str = f"{tp_price:.4f}"; sl_price_str = f"{sl_price:.4f}"
-        logging.info(f"倉位開倉均價: {open_price:.4f}, 設定 TP: {tp_price_str}, SL: {sl_price_str}")
-        update_status(f"持有 {position_side} 倉位, 開倉價: {open_price:.4f}, TP: {tp_price_str}, SL: {sl_price_str}")
+        logger.info(f"倉位開倉均價: {open_price:.4f}, 設定 TP: {tp_price_str}, SL: {sl_price_str}")
+        self.update_status(f"持有 {position_side} 倉位, 開倉價: {open_price:.4f}, TP: {tp_price_str}, SL: {sl_price_str}")
 
+        futures = [
+            self._io_pool.submit(self.api.submit_tp_sl_order, expected_price=tp_price_str, **self._order_templates['tp']),
+            self._io_pool.submit(self.api.submit_tp_sl_order, expected_price=sl_price_str, **self._order_templates['sl']),
+        ]
         try:
-            self.api.submit_tp_sl_order(symbol=self.symbol, order_type='tp', expected_price=tp_price_str, plan_type='normal')
-            self.api.submit_tp_sl_order(symbol=self.symbol, order_type='sl', expected_price=sl_price_str, plan_type='normal')
-            logging.info("TP/SL 計畫委託提交成功!")
+            for future in as_completed(futures):
+                future.result()
+            logger.info("TP/SL 計畫委託提交成功!")
         except APIException as e:
-            logging.error(f"提交 TP/SL 計畫委託失敗: {e.response}")
-            logging.info("將嘗試平倉以控制風險...")
+            logger.error(f"提交 TP/SL 計畫委託失敗: {e.response}")
+            logger.info("將嘗試平倉以控制風險...")
             close_side = 2 if position_side == 'long' else 3
-            self.api.new_order(symbol=self.symbol, side=close_side, type='market', size=config.ORDER_SIZE)
+            self.api.new_order(side=close_side, **self._order_templates['close'])
 
     def run(self):
-        logging.info("策略開始運行...")
+        logger.info("策略開始運行...")
+        # 將迴圈內重複使用的設定值與方法綁定為區域變數
+        step_sec = self.kline_step * 60
+        long_thr = config.BIAS_ENTRY_LONG
+        short_thr = config.BIAS_ENTRY_SHORT
+        check_closure = self.check_trade_closure
+        get_klines = self.get_kline_data
+        calculate_indicators = self.calculate_indicators
+        update_status = self.update_status
+        sleep = time.sleep
         while True:
             try:
-                current_time = time.time()
-                next_run_time = (current_time // (self.kline_step * 60) + 1) * (self.kline_step * 60)
-                
-                if self.last_kline_open_time >= next_run_time - (self.kline_step * 60): time.sleep(10); continue
+                now = time.time()
+                next_run_time = (now // step_sec + 1) * step_sec
 
                 # 在進入主要邏輯前，先檢查倉位是否已關閉
-                self.check_trade_closure()
+                check_closure()
 
                 if not self.active_position:
-                    sleep_duration = next_run_time - current_time
+                    if self.last_kline_open_time >= next_run_time - step_sec:
+                        # 本根 K 線已處理過，直接睡到下一根收盤
+                        sleep(max(0, next_run_time - now + KLINE_CLOSE_JITTER))
+                        continue
+
+                    sleep_duration = next_run_time - now
                     if sleep_duration > 0:
-                        update_status(f"等待 {self.kline_step}m K線... (剩餘 {sleep_duration:.0f} 秒)")
-                        time.sleep(sleep_duration)
+                        update_status(f"等待 {self.kline_step}m K線... (剩餘 {sleep_duration:.0f} 秒)", now)
+                        sleep(sleep_duration)
 
                     update_status("獲取 K 線數據並計算指標...")
-                    klines = self.get_kline_data()
-                    if not klines: continue
+                    klines = get_klines()
+                    if klines is None: continue
                     
-                    self.last_kline_open_time = int(klines[-1]['timestamp'])
-                    indicators = self.calculate_indicators(klines)
-                    logging.info(f"價格: {indicators['current_price']}, MA({self.ma_period}): {indicators['ma']:.4f}, BIAS: {indicators['bias']:.4%}")
+                    indicators = calculate_indicators(klines)
+                    if logger.isEnabledFor(logging.INFO):
+                        logger.info("價格: %s, MA(%d): %.4f, BIAS: %.4f%%",
+                                    indicators['current_price'], self.ma_period, indicators['ma'], indicators['bias'] * 100)
 
-                    if indicators['bias'] <= config.BIAS_ENTRY_LONG:
-                        logging.info(f"偵測到做多信號 (BIAS <= {config.BIAS_ENTRY_LONG:.2%})，執行開倉。")
+                    if indicators['bias'] <= long_thr:
+                        logger.info(f"偵測到做多信號 (BIAS <= {long_thr:.2%})，執行開倉。")
                         self.execute_trade_entry(side=4, indicators=indicators)
 
-                    elif indicators['bias'] >= config.BIAS_ENTRY_SHORT:
-                        logging.info(f"偵測到做空信號 (BIAS >= {config.BIAS_ENTRY_SHORT:.2%})，執行開倉。")
+                    elif indicators['bias'] >= short_thr:
+                        logger.info(f"偵測到做空信號 (BIAS >= {short_thr:.2%})，執行開倉。")
                         self.execute_trade_entry(side=1, indicators=indicators)
                 else:
-                    update_status(f"持有 {self.active_position['side']} 倉位，等待 TP/SL 觸發...")
-                    time.sleep(60) # 持倉時，不需要頻繁檢查
+                    update_status(f"持有 {self.active_position['side']} 倉位，等待 TP/SL 觸發...", now)
+                    sleep(60) # 持倉時，不需要頻繁檢查
 
             except KeyboardInterrupt:
-                logging.info("接收到手動中斷信號，策略停止。")
+                logger.info("接收到手動中斷信號，策略停止。")
                 self.cancel_all_plan_orders("手動停止程序")
+                self._io_pool.shutdown(wait=False)
                 break
             except Exception as e:
-                logging.error(f"主循環發生未知錯誤: {e}", exc_info=True)
-                update_status(f"發生嚴重錯誤: {e}")
+                logger.error(f"主循環發生未知錯誤: {e}", exc_info=True)
+                self.update_status(f"發生嚴重錯誤: {e}")
                 time.sleep(60)
 
 if __name__ == "__main__":
@@ -4,47 +4,142 @@ import json
 import subprocess
 import csv
 import time
+import signal
+import functools
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+import ctypes
 
 # --- 常數設定 ---
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 STRATEGY_DIR = os.path.join(ROOT_DIR, 'cta_strategy')
 RUNNING_PROCS_FILE = os.path.join(ROOT_DIR, '.running_strategies.json')
 
+# Win32 進程存取權限與狀態碼
+PROCESS_TERMINATE = 0x0001
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+ERROR_ACCESS_DENIED = 5
+
+if os.name == 'nt':
+    from ctypes import wintypes
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.GetExitCodeProcess.argtypes = (wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD))
+    kernel32.TerminateProcess.argtypes = (wintypes.HANDLE, wintypes.UINT)
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+# 狀態檔單次讀取的上限與共用讀取緩衝區
+STATUS_READ_SIZE = 4096
+_status_buf = bytearray(STATUS_READ_SIZE)
+
+# CLI 橫幅與幫助訊息，於載入時組好，顯示時一次寫出
+BANNER_TEXT = r"""
+    ____                 _         _____         _     _           
+   / __ \               | |       |_   _|       | |   | |          
+  | |  | |_ __   ___  __| |   __ _  | |   _ __  | | __| | ___ _ __ 
+  | |  | | '_ \ / _ \/ _` |  / _` | | |  | '_ \ | |/ _` |/ _ \ '__|
+  | |__| | |_) |  __/ (_| | | (_| | | |  | | | || | (_| |  __/ |   
+   \____/| .__/ \___|\__,_|  \__,_| |_|  |_| |_||_|
+\__,_\___|_|   
+         | |                                                      
+         |_|                  CLI v1.0 - Happy Trading
+    """
+HELP_TEXT = """
+    可用指令:
+      start     - 啟動一個新的策略。
+      stop      - 停止一個正在運行的策略。
+      status    - 查看正在運行的策略的即時狀態。
+      history   - 查看一個策略的歷史交易紀錄與績效。
+      help      - 顯示此幫助訊息。
+      exit      - 退出 CLI。
+    """
+_HELP_OUTPUT = HELP_TEXT + "\n"
+_BANNER_AND_HELP_OUTPUT = BANNER_TEXT + "\n" + _HELP_OUTPUT
+
 # --- 輔助函式 ---
 
+@functools.lru_cache(maxsize=1)
 def discover_strategies():
-    """掃描 cta_strategy 資料夾，找出所有可用的策略"""
-    strategies = []
-    for name in os.listdir(STRATEGY_DIR):
-        path = os.path.join(STRATEGY_DIR, name)
-        if os.path.isdir(path) and 'strategy.py' in os.listdir(path):
-            strategies.append(name)
-    return strategies
+    """掃描 cta_strategy 資料夾，找出所有可用的策略 (結果會被快取)"""
+    with os.scandir(STRATEGY_DIR) as it:
+        return tuple(entry.name for entry in it
+                     if entry.is_dir() and os.path.exists(os.path.join(entry.path, 'strategy.py')))
 
 def get_running_procs():
     """讀取正在運行的策略進程資訊"""
     if not os.path.exists(RUNNING_PROCS_FILE):
         return {}
-    with open(RUNNING_PROCS_FILE, 'r') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+    with open(RUNNING_PROCS_FILE, 'rb') as f:
+        data = f.read()
+    try:
+        return orjson.loads(data) if orjson else json.loads(data)
+    except json.JSONDecodeError: # orjson.JSONDecodeError 亦為其子類別
+        return {}
 
 def save_running_procs(procs):
     """儲存正在運行的策略進程資訊"""
-    with open(RUNNING_PROCS_FILE, 'w') as f:
-        json.dump(procs, f, indent=4)
+    if orjson:
+        data = orjson.dumps(procs, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(procs, indent=2).encode('utf-8')
+    with open(RUNNING_PROCS_FILE, 'wb') as f:
+        f.write(data)
+    discover_strategies.cache_clear()
 
 def is_process_running(pid):
     """檢查進程是否仍在運行"""
+    if os.name != 'nt':
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True # 進程存在，但屬於其他使用者
+        return True
+
+    # os.kill(pid, 0) 在 Windows 上會直接終止進程，這裡改用 Win32 API 查詢
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+    try:
+        code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return False
+        return code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+def kill_process(pid):
+    """強制終止進程，失敗時拋出 OSError"""
+    if os.name != 'nt':
+        os.kill(pid, signal.SIGTERM)
+        return
+
+    handle = kernel32.OpenProcess(PROCESS_TERMINATE, False, pid)
+    if not handle:
+        raise ctypes.WinError(ctypes.get_last_error())
+    try:
+        if not kernel32.TerminateProcess(handle, 1):
+            raise ctypes.WinError(ctypes.get_last_error())
+    finally:
+        kernel32.CloseHandle(handle)
+
+def read_status(status_file):
+    """讀取策略狀態檔，以 UTF-8 解碼一次"""
+    fd = os.open(status_file, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
     try:
-        # os.kill(pid, 0) 在 Windows 上會直接終止進程，這裡改用 tasklist
-        cmd = f'tasklist /FI "PID eq {pid}"'
-        output = subprocess.check_output(cmd, shell=True, stderr=subprocess.STDOUT)
-        return str(pid) in str(output)
-    except subprocess.CalledProcessError:
-        return False # 命令執行失敗，通常意味著進程不存在
+        if hasattr(os, 'readv'):
+            # 讀入共用緩衝區，避免每次配置新的 bytes
+            size = os.readv(fd, [_status_buf])
+            return str(memoryview(_status_buf)[:size], 'utf-8', 'replace').strip()
+        return os.read(fd, STATUS_READ_SIZE).decode('utf-8', 'replace').strip()
+    finally:
+        os.close(fd)
 
 # --- 指令函式 ---
 
@@ -107,8 +202,7 @@ def stop_strategy():
         pid_to_kill = running_procs[strategy_name]['pid']
 
         print(f"正在停止策略 '{strategy_name}' (PID: {pid_to_kill})...")
-        # 使用 taskkill 強制終止進程
-        subprocess.run(f"taskkill /F /PID {pid_to_kill}", shell=True, check=True, capture_output=True)
+        kill_process(pid_to_kill)
         
         del running_procs[strategy_name]
         save_running_procs(running_procs)
@@ -116,8 +210,8 @@ def stop_strategy():
 
     except (ValueError, IndexError):
         print("錯誤: 無效的選擇。")
-    except subprocess.CalledProcessError as e:
-        print(f"停止進程失敗: {e.stderr.decode('cp950', errors='ignore')}")
+    except OSError as e:
+        print(f"停止進程失敗: {e}")
     except Exception as e:
         print(f"停止失敗: {e}")
 
@@ -140,9 +234,7 @@ def show_status():
 
         status_file = os.path.join(STRATEGY_DIR, name, 'status.log')
         if os.path.exists(status_file):
-            with open(status_file, 'r') as f:
-                status = f.read().strip()
-                print(f"  狀態: {status}")
+            print(f"  狀態: {read_status(status_file)}")
         else:
             print("  狀態: 正在初始化或尚未回報狀態...")
     
@@ -173,23 +265,24 @@ def show_history():
             print(f"策略 '{strategy_name}' 沒有任何交易紀錄。")
             return
 
-        print(f"\n--- '{strategy_name}' 交易歷史 ---")
         total_pnl = 0
         trade_count = 0
-        with open(history_file, 'r') as f:
+        lines = [f"\n--- '{strategy_name}' 交易歷史 ---"]
+        with open(history_file, 'r', newline='', buffering=256 * 1024) as f:
             reader = csv.reader(f)
             header = next(reader) # 跳過標頭
-            print(f"{header[0]:<20} {header[2]:<5} {header[4]:>10} {header[5]:>10}")
-            print("-"*50)
+            lines.append(f"{header[0]:<20} {header[2]:<5} {header[4]:>10} {header[5]:>10}")
+            lines.append("-"*50)
             for row in reader:
                 trade_count += 1
                 pnl = float(row[4]) if row[4] else 0
                 total_pnl += pnl
-                print(f"{row[0]:<20} {row[2]:<5} {pnl:>10.4f} {row[5]:>10}")
+                lines.append(f"{row[0]:<20} {row[2]:<5} {pnl:>10.4f} {row[5]:>10}")
         
-        print("-"*50)
-        print(f"總交易次數: {trade_count}")
-        print(f"總盈虧: {total_pnl:.4f}")
+        lines.append("-"*50)
+        lines.append(f"總交易次數: {trade_count}")
+        lines.append(f"總盈虧: {total_pnl:.4f}")
+        sys.stdout.write('\n'.join(lines) + '\n')
 
     except (ValueError, IndexError):
         print("錯誤: 無效的選擇。")
@@ -198,31 +291,12 @@ def show_history():
 
 def show_help():
     """顯示幫助訊息"""
-    print("""
-    可用指令:
-      start     - 啟動一個新的策略。
-      stop      - 停止一個正在運行的策略。
-      status    - 查看正在運行的策略的即時狀態。
-      history   - 查看一個策略的歷史交易紀錄與績效。
-      help      - 顯示此幫助訊息。
-      exit      - 退出 CLI。
-    """)
+    sys.stdout.write(_HELP_OUTPUT)
 
 def show_banner_and_help():
     """顯示酷炫的橫幅和幫助訊息"""
-    banner = r"""
-    ____                 _         _____         _     _           
-   / __ \               | |       |_   _|       | |   | |          
-  | |  | |_ __   ___  __| |   __ _  | |   _ __  | | __| | ___ _ __ 
-  | |  | | '_ \ / _ \/ _` |  / _` | | |  | '_ \ | |/ _` |/ _ \ '__|
-  | |__| | |_) |  __/ (_| | | (_| | | |  | | | || | (_| |  __/ |   
-   \____/| .__/ \___|\__,_|  \__,_| |_|  |_| |_||_|
-\__,_\___|_|   
-         | |                                                      
-         |_|                  CLI v1.0 - Happy Trading
-    """
-    print(banner)
-    show_help()
+    sys.stdout.write(_BANNER_AND_HELP_OUTPUT)
+    sys.stdout.flush()
 
 # --- 主循環 ---
 